@@ -4,9 +4,10 @@ Interactive coordinate picker using matplotlib.
 Click on hands to get coordinates for SAM3 tracking.
 """
 
+import sys
 import argparse
+import cv2
 import matplotlib.pyplot as plt
-import matplotlib.image as mpimg
 from pathlib import Path
 import json
 
@@ -17,11 +18,26 @@ current_hand = "right"
 img = None
 ax = None
 fig = None
+right_scatter = None
+left_scatter = None
+
+
+def refresh():
+    """Update the title for the active hand and schedule a redraw.
+    
+    Points live on persistent scatter artists, so only the title changes;
+    there is no ax.clear() / imshow() of the full frame.
+    """
+    title = f"Right: {len(right_hand_points)} points (green) | Left: {len(left_hand_points)} points (red)\n"
+    title += f"Now clicking {current_hand.upper()} hand | Press SPACE to switch, ENTER to finish"
+    # set_title keeps the previous colour unless told otherwise
+    ax.set_title(title, fontsize=12, pad=20, color='green' if current_hand == 'right' else 'red')
+    fig.canvas.draw_idle()
 
 
 def onclick(event):
     """Handle mouse click events."""
-    global right_hand_points, left_hand_points, current_hand, ax, fig
+    global right_hand_points, left_hand_points
     
     if event.xdata is None or event.ydata is None:
         return
@@ -30,74 +46,45 @@ def onclick(event):
     
     if current_hand == "right":
         right_hand_points.append([x, y])
+        right_scatter.set_offsets(right_hand_points)
         color = 'lime'
         label = f"R{len(right_hand_points)}"
     else:
         left_hand_points.append([x, y])
+        left_scatter.set_offsets(left_hand_points)
         color = 'red'
         label = f"L{len(left_hand_points)}"
     
-    # Draw point
-    ax.plot(x, y, 'o', color=color, markersize=10, markeredgecolor='white', markeredgewidth=2)
+    # Draw label (the point itself lives in the hand's scatter artist)
     ax.text(x+10, y-10, label, color=color, fontsize=12, fontweight='bold',
             bbox=dict(boxstyle='round', facecolor='black', alpha=0.7))
     
     print(f"{current_hand.upper()} hand: [{x}, {y}]")
     
-    # Update title
-    title = f"Right: {len(right_hand_points)} points (green) | Left: {len(left_hand_points)} points (red)\n"
-    title += "Press SPACEBAR to switch hands | Press ENTER to finish"
-    ax.set_title(title, fontsize=12, pad=20)
-    
-    fig.canvas.draw()
+    refresh()
 
 
 def onkey(event):
     """Handle keyboard events."""
-    global current_hand, ax, fig, img, right_hand_points, left_hand_points
+    global current_hand
     
     if event.key == ' ':  # Spacebar to switch hands
-        if current_hand == "right":
-            current_hand = "left"
-            print("\n>>> Switched to LEFT hand (red dots)")
-            # Redraw image and existing points
-            ax.clear()
-            ax.imshow(img)
-            ax.axis('off')
-            
-            # Redraw right hand points
-            for point in right_hand_points:
-                ax.plot(point[0], point[1], 'go', markersize=10, markeredgewidth=2, markeredgecolor='white')
-            
-            title = f"Right: {len(right_hand_points)} points (green) | Left: {len(left_hand_points)} points (red)\n"
-            title += "Now clicking LEFT hand | Press SPACE when done, ENTER to finish"
-            ax.set_title(title, fontsize=12, pad=20)
-            fig.canvas.draw_idle()
-        else:
-            current_hand = "right"
-            print("\n>>> Switched to RIGHT hand (green dots)")
-            # Redraw image and existing points
-            ax.clear()
-            ax.imshow(img)
-            ax.axis('off')
-            
-            # Redraw both hands points
-            for point in right_hand_points:
-                ax.plot(point[0], point[1], 'go', markersize=10, markeredgewidth=2, markeredgecolor='white')
-            for point in left_hand_points:
-                ax.plot(point[0], point[1], 'ro', markersize=10, markeredgewidth=2, markeredgecolor='white')
-            
-            title = f"Right: {len(right_hand_points)} points (green) | Left: {len(left_hand_points)} points (red)\n"
-            title += "Now clicking RIGHT hand | Press SPACE when done, ENTER to finish"
-            ax.set_title(title, fontsize=12, pad=20)
-            fig.canvas.draw_idle()
+        current_hand = "left" if current_hand == "right" else "right"
+        color = "red" if current_hand == "left" else "green"
+        print(f"\n>>> Switched to {current_hand.upper()} hand ({color} dots)")
+        refresh()
     
     elif event.key == 'enter':
         plt.close()
 
 
-def main():
-    global img, ax, fig
+def main(argv=None):
+    global img, ax, fig, right_scatter, left_scatter, current_hand
+    
+    # Start from a clean state when called more than once in-process
+    right_hand_points.clear()
+    left_hand_points.clear()
+    current_hand = "right"
     
     # Parse arguments
     parser = argparse.ArgumentParser(description='Label hands on a video frame')
@@ -107,7 +94,7 @@ def main():
                         help='Directory containing video frames (default: ../frames_preview)')
     parser.add_argument('--output', type=str, default='hand_coords.json',
                         help='Output JSON file (default: hand_coords.json)')
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     FRAMES_DIR = args.frames_dir
     FRAME_IDX = args.frame_index
@@ -130,7 +117,7 @@ def main():
     if not frame_path.exists():
         print(f"Error: No frames found in {FRAMES_DIR}/")
         print(f"Checked for: {FRAME_IDX}.jpg or frame_{FRAME_IDX:010d}.jpg")
-        return
+        return 1
     
     print("\n" + "=" * 70)
     print("SAM3 Hand Coordinate Picker")
@@ -144,12 +131,21 @@ def main():
     print("\nNote: Works best with around 8 points per hand")
     print("=" * 70 + "\n")
     
-    img = mpimg.imread(frame_path)
+    # Decode with OpenCV (libjpeg-turbo) and convert BGR -> RGB for matplotlib
+    img = cv2.imread(str(frame_path))
+    if img is None:
+        print(f"Error: Could not read {frame_path}")
+        return 1
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
     
     fig, ax = plt.subplots(figsize=(12, 12))
     ax.imshow(img)
     ax.axis('off')
     
+    # One artist per hand; clicks update offsets instead of adding new lines
+    right_scatter = ax.scatter([], [], s=100, c='lime', edgecolors='white', linewidths=2, zorder=3)
+    left_scatter = ax.scatter([], [], s=100, c='red', edgecolors='white', linewidths=2, zorder=3)
+    
     title = f"RIGHT hand mode (green) | Press SPACEBAR to switch, ENTER when done\n"
     title += f"Image size: {img.shape[1]}x{img.shape[0]}"
     ax.set_title(title, fontsize=12, pad=20, color='green')
@@ -183,7 +179,9 @@ def main():
         print("=" * 70 + "\n")
     else:
         print("\nNo points captured!")
+    
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -2,13 +2,19 @@
 """
 Simple pipeline script: Run the complete hand tracking workflow.
 Runs: label_hands.py -> track_hands.py -> visualize_masks.py
+Each step's main() is called in-process, so Python, NumPy/OpenCV and
+torch are only started once for the whole pipeline.
 """
 
 import os
 import sys
-import subprocess
+from functools import lru_cache
 from pathlib import Path
 
+import label_hands
+import track_hands_server
+import visualize_masks
+
 # Colors
 GREEN = '\033[92m'
 RED = '\033[91m'
@@ -35,14 +41,47 @@ def print_info(text):
     """Print info message."""
     print(f"{YELLOW}> {text}{RESET}")
 
-def run_command(cmd, description):
-    """Run a command and check if it succeeded."""
+@lru_cache(maxsize=None)
+def path_exists(path):
+    """Cached os.path.exists; run_step()/run_on_server() clear it since steps create files."""
+    return os.path.exists(path)
+
+def count_ext(directory, ext):
+    """Count files in directory ending with ext (0 if it does not exist)."""
+    try:
+        with os.scandir(directory) as entries:
+            return sum(1 for e in entries if e.name.endswith(ext))
+    except FileNotFoundError:
+        return 0
+
+def run_step(main_func, argv, description):
+    """Run a pipeline script's main() in-process and check if it succeeded."""
     print_info(f"Running: {description}")
-    print(f"  Command: {' '.join(cmd)}\n")
+    print(f"  Arguments: {' '.join(argv)}\n")
+    
+    try:
+        returncode = main_func(argv)
+    except SystemExit as e:
+        # argparse errors exit instead of returning
+        returncode = e.code
+    path_exists.cache_clear()
+    
+    if returncode:
+        print_error(f"Failed: {description}")
+        return False
     
-    result = subprocess.run(cmd)
+    print_success(f"Completed: {description}")
+    return True
+
+def run_on_server(conn, argv, description):
+    """Run track_hands.py on a running track_hands_server.py and check if it succeeded."""
+    print_info(f"Running on SAM3 server: {description}")
+    print(f"  Arguments: {' '.join(argv)}\n")
     
-    if result.returncode != 0:
+    returncode = track_hands_server.request_tracking(conn, argv)
+    path_exists.cache_clear()
+    
+    if returncode != 0:
         print_error(f"Failed: {description}")
         return False
     
@@ -92,7 +131,7 @@ def main():
     coords_file = Path("hand_coords.json")
     skip_labeling = False
     
-    if coords_file.exists():
+    if path_exists(str(coords_file)):
         print_info("Found existing hand_coords.json")
         response = input(f"{YELLOW}Skip labeling and use existing coordinates? (Y/n): {RESET}")
         if response.lower() != 'n':
@@ -111,14 +150,15 @@ def main():
         print()
         input(f"{YELLOW}Press Enter to start labeling...{RESET}")
         
-        if not run_command(
-            ["python", "label_hands.py", "--frame-index", str(start_frame)],
+        if not run_step(
+            label_hands.main,
+            ["--frame-index", str(start_frame)],
             f"Hand labeling (frame {start_frame})"
         ):
             print_error("Labeling failed. Exiting.")
             return 1
         
-        if not coords_file.exists():
+        if not path_exists(str(coords_file)):
             print_error("hand_coords.json not created. Labeling may have failed.")
             return 1
     
@@ -127,22 +167,41 @@ def main():
     print_info(f"Processing frames {start_frame} to {start_frame + max_frames - 1} ({max_frames} total)")
     print()
 
-    tracking_cmd = ["python", "track_hands.py", "--start-frame", str(start_frame), "--max-frames", str(max_frames)]
+    tracking_args = ["--start-frame", str(start_frame), "--max-frames", str(max_frames)]
+    tracking_desc = f"Hand tracking ({max_frames} frames starting from {start_frame})"
+    masks_dir = Path("output/masks")
     
-    if not run_command(
-        tracking_cmd,
-        f"Hand tracking ({max_frames} frames starting from {start_frame})"
-    ):
-        print_error("Tracking failed. Exiting.")
-        return 1
+    # Reuse the already-loaded model if track_hands_server.py is running
+    conn = track_hands_server.connect()
+    if conn is not None:
+        with conn:
+            print_info("Found running track_hands_server.py, reusing its loaded model")
+            tracked = True
+            # The server cannot prompt, so ask about existing masks here
+            existing = count_ext(masks_dir, ".png")
+            if existing:
+                response = input(f"{YELLOW}Found {existing} existing masks. Delete and rerun tracking? (y/N): {RESET}")
+                if response.lower() == 'y':
+                    tracking_args.append("--overwrite")
+                else:
+                    print_info("Skipping tracking. Keeping existing masks.")
+                    tracked = False
+            if tracked and not run_on_server(conn, tracking_args, tracking_desc):
+                print_error("Tracking failed. Exiting.")
+                return 1
+    else:
+        # Imported only when needed: loads samgeo/torch
+        import track_hands
+        if not run_step(track_hands.main, tracking_args, tracking_desc):
+            print_error("Tracking failed. Exiting.")
+            return 1
     
     # Check if masks were created
-    masks_dir = Path("output/masks")
-    if not masks_dir.exists() or not list(masks_dir.glob("*.png")):
+    mask_count = count_ext(masks_dir, ".png")
+    if mask_count == 0:
         print_error("No masks generated. Tracking may have failed.")
         return 1
     
-    mask_count = len(list(masks_dir.glob("*.png")))
     print_success(f"Generated {mask_count} masks")
     
     # Step 3: Visualize
@@ -150,10 +209,11 @@ def main():
     print_info("Creating colored overlays (green=right hand, red=left hand)")
     print()
     
-    vis_cmd = ["python", "visualize_masks.py", "--start-frame", str(start_frame)]
+    vis_args = ["--start-frame", str(start_frame)]
     
-    if not run_command(
-        vis_cmd,
+    if not run_step(
+        visualize_masks.main,
+        vis_args,
         "Visualization"
     ):
         print_error("Visualization failed. Exiting.")
@@ -161,8 +221,8 @@ def main():
     
     # Check results
     vis_dir = Path("output/visualizations")
-    if vis_dir.exists():
-        vis_count = len(list(vis_dir.glob("*.jpg")))
+    if path_exists(str(vis_dir)):
+        vis_count = count_ext(vis_dir, ".jpg")
         print_success(f"Generated {vis_count} visualizations")
     
     # Success!
@@ -6,11 +6,19 @@ import sys
 import json
 import shutil
 import argparse
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+import cv2
 import numpy as np
-from PIL import Image
+import torch
 from samgeo import SamGeo3Video
 
-def parse_args():
+# SAM3's tracker already runs the whole model under bf16 autocast; --precision
+# overrides that for propagation (fp32 disables autocast and needs more VRAM)
+PRECISIONS = {'fp16': torch.float16, 'fp32': None}
+
+def parse_args(argv=None):
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description='Track hands through video frames using SAM3')
     parser.add_argument('--start-frame', type=int, default=0,
@@ -26,129 +34,255 @@ def parse_args():
     parser.add_argument('--output-dir', type=str, default='output/masks',
                         help='Output directory for masks (default: output/masks)')
     parser.add_argument('--temp-dir', type=str, default='frames_temp',
-                        help='Temporary directory for frame copies (default: frames_temp)')
-    return parser.parse_args()
-
-# Parse arguments
-args = parse_args()
-
-# Configuration
-START_FRAME = args.start_frame
-MAX_FRAMES = args.max_frames
-END_FRAME = args.end_frame
-FRAMES_DIR = args.frames_dir
-TEMP_DIR = args.temp_dir
-OUTPUT_DIR = args.output_dir
-COORDS_FILE = args.coords_file
-
-# Load coordinates
-with open(COORDS_FILE, 'r') as f:
-    coords = json.load(f)
-
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-os.makedirs(TEMP_DIR, exist_ok=True)
-
-print("\n" + "=" * 70)
-print("SAM3 Hand Tracking (Limited)")
-print("=" * 70)
-if END_FRAME is not None:
-    num_frames = END_FRAME - START_FRAME
-    print(f"Processing frames {START_FRAME} to {END_FRAME-1} ({num_frames} frames)")
-else:
-    print(f"Processing {MAX_FRAMES} frames starting from frame {START_FRAME}")
-print(f"Right hand: {len(coords['right'])} points")
-print(f"Left hand: {len(coords['left'])} points")
-print("=" * 70 + "\n")
-
-# Check if masks already exist
-if os.path.exists(OUTPUT_DIR):
-    existing_masks = [f for f in os.listdir(OUTPUT_DIR) if f.endswith('.png')]
-    if existing_masks:
-        print(f"WARNING:  WARNING: Found {len(existing_masks)} existing masks in {OUTPUT_DIR}/")
-        
+                        help='Temporary directory for staged frames (default: frames_temp)')
+    parser.add_argument('--precision', choices=sorted(PRECISIONS), default=None,
+                        help="Override SAM3's built-in bf16 autocast for mask propagation (default: keep bf16)")
+    parser.add_argument('--compile', action='store_true',
+                        help='Compile the SAM3 model with torch.compile (slow first run, faster propagation)')
+    parser.add_argument('--overwrite', action='store_true',
+                        help='Delete existing masks without prompting')
+    return parser.parse_args(argv)
+
+def list_files(directory, ext):
+    """Return sorted names of regular files in directory ending with ext."""
+    with os.scandir(directory) as entries:
+        return sorted(e.name for e in entries if e.name.endswith(ext) and e.is_file())
+
+def stage_frame(src, dst):
+    """Link a frame into the temp directory, copying only as a last resort."""
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.symlink(os.path.abspath(src), dst)
+    except OSError:
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy(src, dst)
+
+def check_existing_masks(output_dir, overwrite=False):
+    """Deal with masks left over from a previous run.
+
+    Returns True if tracking should go ahead, False to keep the existing masks.
+    """
+    existing_masks = list_files(output_dir, '.png')
+    if not existing_masks:
+        return True
+
+    print(f"WARNING:  WARNING: Found {len(existing_masks)} existing masks in {output_dir}/")
+
+    if not overwrite:
         # Handle non-interactive mode
         if not sys.stdin.isatty():
             print("Running in non-interactive mode, skipping existing masks.")
-            if os.path.exists(TEMP_DIR):
-                shutil.rmtree(TEMP_DIR)
-            exit(0)
-        
+            return False
+
         response = input("Delete and rerun tracking? (y/N): ")
         if response.lower() != 'y':
             print("Skipping tracking. Keeping existing masks.")
-            # Clean up temp dir and exit
-            if os.path.exists(TEMP_DIR):
-                shutil.rmtree(TEMP_DIR)
-            exit(0)
-        else:
-            print(f"Deleting {len(existing_masks)} existing masks...")
-            for f in existing_masks:
-                os.remove(os.path.join(OUTPUT_DIR, f))
-            print("> Deleted existing masks\n")
-
-# Copy frames to temp directory based on start/end range
-all_frames = sorted([f for f in os.listdir(FRAMES_DIR) if f.endswith('.jpg')])
-
-if END_FRAME is not None:
-    frames_to_process = all_frames[START_FRAME:END_FRAME]
-else:
-    frames_to_process = all_frames[START_FRAME:START_FRAME + MAX_FRAMES]
-
-print(f"Copying {len(frames_to_process)} frames to temp directory...")
-for frame_file in frames_to_process:
-    shutil.copy(os.path.join(FRAMES_DIR, frame_file), os.path.join(TEMP_DIR, frame_file))
-print("> Frames copied\n")
-
-# Initialize SAM3
-print("Initializing SAM3...")
-sam = SamGeo3Video()
-sam.set_video(TEMP_DIR)
-sam.init_tracker()
-print("> Initialized\n")
-
-# Add prompts for right hand
-if coords['right']:
-    print(f"Adding right hand prompts...")
-    sam.add_point_prompts(
-        points=coords['right'],
-        labels=[1] * len(coords['right']),
-        obj_id=1,
-        frame_idx=0
-    )
-    print("> Right hand prompts added")
-
-# Add prompts for left hand
-if coords['left']:
-    print(f"Adding left hand prompts...")
-    sam.add_point_prompts(
-        points=coords['left'],
-        labels=[1] * len(coords['left']),
-        obj_id=2,
-        frame_idx=0
-    )
-    print("> Left hand prompts added\n")
-
-# Propagate
-print("Propagating masks through video...")
-sam.propagate()
-print("> Propagation complete\n")
-
-# Save masks
-print("Saving masks...")
-sam.save_masks(OUTPUT_DIR)
-print(f"> Masks saved to {OUTPUT_DIR}")
-
-# Check mask content
-mask_files = sorted([f for f in os.listdir(OUTPUT_DIR) if f.endswith('.png')])
-if mask_files:
-    first_mask = np.array(Image.open(os.path.join(OUTPUT_DIR, mask_files[0])))
-    last_mask = np.array(Image.open(os.path.join(OUTPUT_DIR, mask_files[-1])))
-    print(f"\nFirst mask unique values: {np.unique(first_mask)}")
-    print(f"Last mask unique values: {np.unique(last_mask)}")
-    print(f"Total mask files: {len(mask_files)}")
-
-# Cleanup
-sam.close()
-shutil.rmtree(TEMP_DIR)
-print("\n> Done!")
-print(f"Processed {len(mask_files)} frames successfully")
+            return False
+
+    print(f"Deleting {len(existing_masks)} existing masks...")
+    # Unlinks are latency-bound on network filesystems, so issue them concurrently
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        list(executor.map(os.remove, [os.path.join(output_dir, f) for f in existing_masks]))
+    print("> Deleted existing masks\n")
+    return True
+
+def enable_compile(sam):
+    """Turn on SAM3's built-in torch.compile of its backbone, transformer and tracker.
+
+    SAM3 compiles lazily on the first propagation, which init_tracker() already
+    runs, so the real propagate() uses the compiled graphs.
+    """
+    torch.backends.cudnn.benchmark = True
+    torch.set_float32_matmul_precision("high")
+    sam.predictor.model.compile_model = True
+
+def frame_mask(outputs, height, width):
+    """Combine one frame's SAM3 outputs into a mask of object ids (0=background)."""
+    mask = np.zeros((height, width), dtype=np.uint8)
+    for obj_id, obj_mask in zip(outputs['out_obj_ids'].tolist(), outputs['out_binary_masks']):
+        mask[obj_mask] = obj_id
+    return mask
+
+def propagate_and_save(sam, output_dir, num_frames):
+    """Propagate masks through the video, writing each frame's PNG as it arrives.
+
+    Frames are handed to a thread pool as SAM3 yields them, so PNG encoding
+    overlaps GPU propagation instead of running as a serial tail, and only
+    frames still being encoded are held in memory. File names match
+    SamGeo3Video.save_masks() (zero-padded frame index). cv2.imwrite releases
+    the GIL, and PNG level 1 is much cheaper than the default level while
+    masks still compress well. Returns the number of frames written.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    num_digits = len(str(num_frames))
+    workers = os.cpu_count() or 1
+    # Bound frames in flight so a slow disk cannot pile masks up in memory
+    in_flight = threading.BoundedSemaphore(2 * workers)
+
+    def write(frame_idx, outputs):
+        try:
+            path = os.path.join(output_dir, f"{str(frame_idx).zfill(num_digits)}.png")
+            mask = frame_mask(outputs, sam.frame_height, sam.frame_width)
+            # imwrite reports failure by returning False, not by raising
+            if not cv2.imwrite(path, mask, [cv2.IMWRITE_PNG_COMPRESSION, 1]):
+                raise OSError(f"Could not write {path}")
+        finally:
+            in_flight.release()
+
+    pending = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for response in sam.predictor.handle_stream_request(
+            dict(type="propagate_in_video", session_id=sam.session_id)
+        ):
+            frame_idx = response["frame_index"]
+            # Bidirectional propagation can revisit a frame; let the older write
+            # finish first so the later result wins, as in sam.propagate()
+            if frame_idx in pending:
+                pending[frame_idx].result()
+            in_flight.acquire()
+            pending[frame_idx] = executor.submit(write, frame_idx, response["outputs"])
+
+    # Surface any encoder errors
+    for future in pending.values():
+        future.result()
+    return len(pending)
+
+def track(sam, frames_to_process, coords, frames_dir, temp_dir, output_dir, precision=None):
+    """Track both hands over frames_to_process with an already-loaded SAM3.
+
+    Only the video session is closed at the end, so the same SamGeo3Video
+    can be reused for further runs (see track_hands_server.py).
+    Returns the list of mask files written to output_dir.
+    """
+    # SAM3 loads every image in the directory it is given, so frames only need
+    # staging when the selection is not the whole frames directory
+    if len(frames_to_process) == len(os.listdir(frames_dir)):
+        video_dir = frames_dir
+        print(f"Using all {len(frames_to_process)} frames in {frames_dir} directly\n")
+    else:
+        # Stage frames in a fresh temp directory (a failed earlier run may have left links)
+        video_dir = temp_dir
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+        os.makedirs(temp_dir)
+        print(f"Staging {len(frames_to_process)} frames in temp directory...")
+        for frame_file in frames_to_process:
+            stage_frame(os.path.join(frames_dir, frame_file), os.path.join(temp_dir, frame_file))
+        print("> Frames staged\n")
+
+    sam.set_video(video_dir)
+    sam.init_tracker()
+    print("> Initialized\n")
+
+    # Add prompts for right hand
+    if coords['right']:
+        print(f"Adding right hand prompts...")
+        sam.add_point_prompts(
+            points=coords['right'],
+            labels=[1] * len(coords['right']),
+            obj_id=1,
+            frame_idx=0
+        )
+        print("> Right hand prompts added")
+
+    # Add prompts for left hand
+    if coords['left']:
+        print(f"Adding left hand prompts...")
+        sam.add_point_prompts(
+            points=coords['left'],
+            labels=[1] * len(coords['left']),
+            obj_id=2,
+            frame_idx=0
+        )
+        print("> Left hand prompts added\n")
+
+    # Propagate and save masks as frames come out
+    print(f"Propagating and saving masks through video ({precision or 'bf16'})...")
+    if precision is None:
+        autocast = nullcontext()
+    else:
+        dtype = PRECISIONS[precision]
+        autocast = torch.autocast("cuda", dtype=dtype or torch.float16, enabled=dtype is not None)
+    with torch.inference_mode(), autocast:
+        num_saved = propagate_and_save(sam, output_dir, len(frames_to_process))
+    print(f"> Propagation complete, {num_saved} masks saved to {output_dir}")
+
+    # Check mask content
+    mask_files = list_files(output_dir, '.png')
+    if mask_files:
+        first_mask = cv2.imread(os.path.join(output_dir, mask_files[0]), cv2.IMREAD_UNCHANGED)
+        last_mask = cv2.imread(os.path.join(output_dir, mask_files[-1]), cv2.IMREAD_UNCHANGED)
+        print(f"\nFirst mask unique values: {np.unique(first_mask)}")
+        print(f"Last mask unique values: {np.unique(last_mask)}")
+        print(f"Total mask files: {len(mask_files)}")
+
+    # Cleanup
+    sam.close()
+    if video_dir == temp_dir:
+        shutil.rmtree(temp_dir)
+    return mask_files
+
+def main(argv=None, sam=None):
+    """Run hand tracking; pass an existing SamGeo3Video as sam to skip model loading."""
+    args = parse_args(argv)
+
+    # Configuration
+    START_FRAME = args.start_frame
+    MAX_FRAMES = args.max_frames
+    END_FRAME = args.end_frame
+    FRAMES_DIR = args.frames_dir
+    TEMP_DIR = args.temp_dir
+    OUTPUT_DIR = args.output_dir
+    COORDS_FILE = args.coords_file
+
+    # Load coordinates
+    with open(COORDS_FILE, 'r') as f:
+        coords = json.load(f)
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    print("\n" + "=" * 70)
+    print("SAM3 Hand Tracking (Limited)")
+    print("=" * 70)
+    if END_FRAME is not None:
+        num_frames = END_FRAME - START_FRAME
+        print(f"Processing frames {START_FRAME} to {END_FRAME-1} ({num_frames} frames)")
+    else:
+        print(f"Processing {MAX_FRAMES} frames starting from frame {START_FRAME}")
+    print(f"Right hand: {len(coords['right'])} points")
+    print(f"Left hand: {len(coords['left'])} points")
+    print("=" * 70 + "\n")
+
+    # Check if masks already exist
+    if not check_existing_masks(OUTPUT_DIR, args.overwrite):
+        # Clean up temp dir and exit
+        if os.path.exists(TEMP_DIR):
+            shutil.rmtree(TEMP_DIR)
+        return 0
+
+    # Select frames based on start/end range
+    all_frames = list_files(FRAMES_DIR, '.jpg')
+
+    if END_FRAME is not None:
+        frames_to_process = all_frames[START_FRAME:END_FRAME]
+    else:
+        frames_to_process = all_frames[START_FRAME:START_FRAME + MAX_FRAMES]
+
+    # Initialize SAM3
+    print("Initializing SAM3...")
+    if sam is None:
+        sam = SamGeo3Video()
+    if args.compile:
+        enable_compile(sam)
+
+    mask_files = track(sam, frames_to_process, coords, FRAMES_DIR, TEMP_DIR, OUTPUT_DIR, args.precision)
+
+    print("\n> Done!")
+    print(f"Processed {len(mask_files)} frames successfully")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
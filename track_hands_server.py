@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Keep SAM3 loaded between tracking runs.
+Loads SamGeo3Video once and serves track_hands.py requests over a local socket,
+so repeated runs (e.g. from run_pipeline.py) skip model loading.
+
+The server listens on a Unix socket inside a directory only the current user
+can open, so other users on a shared machine cannot send it requests.
+"""
+
+import os
+import sys
+import argparse
+import traceback
+from multiprocessing.connection import Listener, Client
+
+# Per-user runtime directory (XDG_RUNTIME_DIR is already private to the user)
+SOCKET_DIR = os.path.join(os.environ.get('XDG_RUNTIME_DIR') or os.path.expanduser('~/.cache'),
+                          'sam3-handtracker')
+SOCKET_PATH = os.path.join(SOCKET_DIR, 'server.sock')
+
+
+def connect():
+    """Connect to a running server, or return None if none is listening."""
+    try:
+        return Client(SOCKET_PATH, family='AF_UNIX')
+    except (OSError, ValueError):
+        # ValueError: no AF_UNIX support on this platform
+        return None
+
+
+def prepare_socket_dir():
+    """Create the socket directory as 0700 and clear a stale socket.
+
+    Returns False if another server is already listening.
+    """
+    os.makedirs(SOCKET_DIR, mode=0o700, exist_ok=True)
+    if os.stat(SOCKET_DIR).st_uid != os.getuid():
+        raise PermissionError(f"{SOCKET_DIR} is owned by another user")
+    # makedirs does not change the mode of an existing directory
+    os.chmod(SOCKET_DIR, 0o700)
+
+    if os.path.exists(SOCKET_PATH):
+        conn = connect()
+        if conn is not None:
+            conn.close()
+            return False
+        # Left behind by a server that did not shut down cleanly
+        os.remove(SOCKET_PATH)
+    return True
+
+
+def request_tracking(conn, argv):
+    """Run track_hands.py with argv on the server and return its exit code."""
+    conn.send({'cwd': os.getcwd(), 'argv': argv})
+    reply = conn.recv()
+    if reply.get('error'):
+        print(reply['error'])
+    return reply['returncode']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve SAM3 hand tracking requests with a preloaded model')
+    parser.parse_args()
+
+    if not prepare_socket_dir():
+        print(f"ERROR: A server is already listening on {SOCKET_PATH}")
+        return 1
+
+    # Imported here so clients (connect / request_tracking) stay lightweight
+    import track_hands
+    from samgeo import SamGeo3Video
+
+    print("\n" + "=" * 70)
+    print("SAM3 Hand Tracking Server")
+    print("=" * 70)
+    print("Initializing SAM3...")
+    sam = SamGeo3Video()
+    print("> Model loaded\n")
+
+    with Listener(SOCKET_PATH, family='AF_UNIX') as listener:
+        print(f"> Listening on {SOCKET_PATH} (Ctrl+C to stop)\n")
+        while True:
+            try:
+                conn = listener.accept()
+            except OSError as e:
+                # A client that disconnects mid-handshake must not stop the server
+                print(f"WARNING: Failed to accept a connection: {e}")
+                continue
+            with conn:
+                try:
+                    request = conn.recv()
+                    argv = [str(arg) for arg in request['argv']]
+                    cwd = str(request['cwd'])
+                except EOFError:
+                    # Client connected but decided not to track (e.g. kept existing masks)
+                    continue
+                except Exception as e:
+                    print(f"WARNING: Ignoring malformed request: {e!r}")
+                    continue
+                print(f"Request: track_hands.py {' '.join(argv)}")
+                try:
+                    os.chdir(cwd)
+                    reply = {'returncode': track_hands.main(argv, sam=sam)}
+                except SystemExit as e:
+                    # argparse errors and --help
+                    reply = {'returncode': e.code or 0}
+                except Exception:
+                    traceback.print_exc()
+                    reply = {'returncode': 1, 'error': traceback.format_exc()}
+                    # Drop the failed session so the next request starts clean
+                    try:
+                        sam.close()
+                    except Exception:
+                        traceback.print_exc()
+                try:
+                    conn.send(reply)
+                except OSError as e:
+                    # Client went away mid-request (e.g. Ctrl+C in run_pipeline.py)
+                    print(f"WARNING: Could not send the result back: {e}")
+            print("> Request finished, waiting for the next one\n")
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\nServer stopped")
+        sys.exit(0)
@@ -4,11 +4,26 @@
 import os
 import sys
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import numpy as np
 import cv2
-from PIL import Image
 
-def parse_args():
+# Colors per mask value (BGR format for OpenCV), padded to 256 entries so any
+# uint8 mask value indexes safely (unknown ids render as background)
+PALETTE = np.zeros((256, 3), dtype=np.uint8)
+PALETTE[1] = [0, 255, 0]     # Right hand: green
+PALETTE[2] = [0, 0, 255]     # Left hand: red
+
+# The mask is blended at 50% opacity, which is exact in integers:
+# frame/2 + color/2, so the palette is stored pre-halved
+HALF_PALETTE = PALETTE >> 1
+
+# Same table shaped as a 3-channel cv2.LUT table
+HALF_LUT = HALF_PALETTE.reshape(1, 256, 3)
+
+def parse_args(argv=None):
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description='Visualize hand masks on frames')
     parser.add_argument('--start-frame', type=int, default=0,
@@ -19,84 +34,164 @@ def parse_args():
                         help='Directory containing masks (default: output/masks)')
     parser.add_argument('--output-dir', type=str, default='output/visualizations',
                         help='Output directory for visualizations (default: output/visualizations)')
-    return parser.parse_args()
-
-args = parse_args()
-
-FRAMES_DIR = args.frames_dir
-MASKS_DIR = args.masks_dir
-OUTPUT_DIR = args.output_dir
-
-# Check if output directory already has visualizations
-if os.path.exists(OUTPUT_DIR):
-    existing_vis = [f for f in os.listdir(OUTPUT_DIR) if f.endswith('.jpg')]
-    if existing_vis:
-        print(f"\nWARNING:  WARNING: Found {len(existing_vis)} existing visualizations in {OUTPUT_DIR}/")
-        
-        # Handle non-interactive mode
-        if not sys.stdin.isatty():
-            print("Running in non-interactive mode, skipping existing visualizations.")
-            exit(0)
-        
-        response = input("Delete and recreate visualizations? (y/N): ")
-        if response.lower() != 'y':
-            print("Skipping visualization. Keeping existing files.")
-            exit(0)
-        else:
-            print(f"Deleting {len(existing_vis)} existing visualizations...")
-            for f in existing_vis:
-                os.remove(os.path.join(OUTPUT_DIR, f))
-            print("> Deleted existing visualizations")
-
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-# Get list of masks and frames
-mask_files = sorted([f for f in os.listdir(MASKS_DIR) if f.endswith('.png')])
-all_frame_files = sorted([f for f in os.listdir(FRAMES_DIR) if f.endswith('.jpg')])
-
-# Select frames starting from the specified index
-start_idx = args.start_frame
-frame_files = all_frame_files[start_idx:start_idx + len(mask_files)]
-
-print(f"\nVisualizing {len(mask_files)} masks...")
-print(f"  Masks: {len(mask_files)} files")
-print(f"  Frames: Using indices {start_idx} to {start_idx + len(mask_files) - 1}")
-print(f"  Total available frames: {len(all_frame_files)}")
-
-if len(frame_files) < len(mask_files):
-    print(f"\nERROR: Not enough frames! Need {len(mask_files)}, but only {len(frame_files)} available from index {start_idx}")
-    exit(1)
-
-# Create colormap for hands (BGR format for OpenCV)
-colors = {
-    0: [0, 0, 0],        # Background: black
-    1: [0, 255, 0],      # Right hand: green
-    2: [0, 0, 255]       # Left hand: red
-}
-
-for i, (mask_file, frame_file) in enumerate(zip(mask_files, frame_files)):
+    parser.add_argument('--vis-width', type=int, default=960,
+                        help='Downscale wider frames to this width, 0 keeps full resolution (default: 960)')
+    parser.add_argument('--jpeg-quality', type=int, default=85,
+                        help='JPEG quality of the visualizations (default: 85)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Number of frames processed in parallel (default: CPU count)')
+    return parser.parse_args(argv)
+
+def list_files(directory, ext):
+    """List the *ext images in directory in frame order."""
+    with os.scandir(directory) as entries:
+        return sorted(e.name for e in entries if e.name.endswith(ext) and e.is_file())
+
+def prefetch(paths):
+    """Ask the kernel to start reading paths into the page cache (Linux readahead).
+
+    posix_fadvise returns immediately, so disk reads for upcoming frames overlap
+    with the blending of current ones without holding decoded copies in memory.
+    Does nothing where posix_fadvise is unavailable.
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+
+# Per-worker colored-mask and overlay buffers, reused across frames
+_buffers = threading.local()
+
+def frame_buffers(shape):
+    """Return this thread's (colored, overlay) buffers, reallocating if shape changed."""
+    buffers = getattr(_buffers, 'arrays', None)
+    if buffers is None or buffers[0].shape != shape:
+        buffers = (np.empty(shape, dtype=np.uint8), np.empty(shape, dtype=np.uint8))
+        _buffers.arrays = buffers
+    return buffers
+
+def process_frame(mask_path, frame_path, output_path, jpeg_params, vis_width=0):
+    """Blend one mask onto its frame and save the visualization."""
     # Load mask and frame
-    mask = np.array(Image.open(os.path.join(MASKS_DIR, mask_file)))
-    frame = cv2.imread(os.path.join(FRAMES_DIR, frame_file))
-    
-    # Create colored mask
-    colored_mask = np.zeros_like(frame)
-    for obj_id, color in colors.items():
-        colored_mask[mask == obj_id] = color
+    mask = cv2.imread(mask_path, cv2.IMREAD_UNCHANGED)
+    if mask is None or mask.dtype != np.uint8 or mask.ndim != 2:
+        raise ValueError(f"Expected a single-channel 8-bit mask: {mask_path}")
+    frame = cv2.imread(frame_path)
+    # The blend writes into per-thread buffers, so a size mismatch would
+    # silently reuse stale data instead of failing
+    if mask.shape != frame.shape[:2]:
+        raise ValueError(f"Mask {mask_path} is {mask.shape[1]}x{mask.shape[0]}, "
+                         f"frame {frame_path} is {frame.shape[1]}x{frame.shape[0]}")
+
+    # Shrink both to the visualization width; nearest keeps mask ids intact
+    if vis_width and frame.shape[1] > vis_width:
+        scale = vis_width / frame.shape[1]
+        frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        mask = cv2.resize(mask, (frame.shape[1], frame.shape[0]), interpolation=cv2.INTER_NEAREST)
     
-    # Blend with frame
-    alpha = 0.5
-    overlay = cv2.addWeighted(frame, 1-alpha, colored_mask, alpha, 0)
+    # Color the mask with a palette lookup and blend it onto the frame, both
+    # written into this thread's buffers instead of fresh arrays per frame.
+    # cv2.LUT maps each channel of the replicated mask through its own column
+    # of the table. Both halves are <= 127, so the uint8 add cannot overflow
+    colored, overlay = frame_buffers(frame.shape)
+    np.right_shift(frame, 1, out=overlay)
+    # Background maps to black, so frames without any hand are just the
+    # darkened frame and skip the lookup and add
+    if cv2.countNonZero(mask):
+        cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR, dst=colored)
+        cv2.LUT(colored, HALF_LUT, dst=colored)
+        cv2.add(overlay, colored, dst=overlay)
     
     # Save visualization
-    output_path = os.path.join(OUTPUT_DIR, f"vis_{i:04d}.jpg")
-    cv2.imwrite(output_path, overlay)
-    
-    if (i + 1) % 10 == 0:
-        print(f"  Processed {i+1}/{len(mask_files)}")
-
-print(f"\n> Saved visualizations to {OUTPUT_DIR}/")
-print(f"  Total files: {len(mask_files)}")
-print(f"\nTo view:")
-print(f"  ls {OUTPUT_DIR}/")
-print(f"  # Open any vis_XXXX.jpg file to see the masks overlaid")
+    cv2.imwrite(output_path, overlay, jpeg_params)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    FRAMES_DIR = args.frames_dir
+    MASKS_DIR = args.masks_dir
+    OUTPUT_DIR = args.output_dir
+
+    # Check if output directory already has visualizations
+    if os.path.exists(OUTPUT_DIR):
+        with os.scandir(OUTPUT_DIR) as entries:
+            existing_vis = [e.path for e in entries if e.name.endswith('.jpg') and e.is_file()]
+        if existing_vis:
+            print(f"\nWARNING:  WARNING: Found {len(existing_vis)} existing visualizations in {OUTPUT_DIR}/")
+            
+            # Handle non-interactive mode
+            if not sys.stdin.isatty():
+                print("Running in non-interactive mode, skipping existing visualizations.")
+                return 0
+            
+            response = input("Delete and recreate visualizations? (y/N): ")
+            if response.lower() != 'y':
+                print("Skipping visualization. Keeping existing files.")
+                return 0
+            else:
+                print(f"Deleting {len(existing_vis)} existing visualizations...")
+                with ThreadPoolExecutor(max_workers=32) as executor:
+                    list(executor.map(os.remove, existing_vis))
+                print("> Deleted existing visualizations")
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    # Get list of masks and frames
+    mask_files = list_files(MASKS_DIR, '.png')
+    all_frame_files = list_files(FRAMES_DIR, '.jpg')
+
+    # Select frames starting from the specified index
+    start_idx = args.start_frame
+    frame_files = all_frame_files[start_idx:start_idx + len(mask_files)]
+
+    print(f"\nVisualizing {len(mask_files)} masks...")
+    print(f"  Masks: {len(mask_files)} files")
+    print(f"  Frames: Using indices {start_idx} to {start_idx + len(mask_files) - 1}")
+    print(f"  Total available frames: {len(all_frame_files)}")
+
+    if len(frame_files) < len(mask_files):
+        print(f"\nERROR: Not enough frames! Need {len(mask_files)}, but only {len(frame_files)} available from index {start_idx}")
+        return 1
+
+    # Build every path once up front
+    num = len(mask_files)
+    mask_paths = [os.path.join(MASKS_DIR, f) for f in mask_files]
+    frame_paths = [os.path.join(FRAMES_DIR, f) for f in frame_files]
+    output_paths = [os.path.join(OUTPUT_DIR, f"vis_{i:04d}.jpg") for i in range(num)]
+
+    # Baseline 4:2:0 JPEG without the extra optimize/progressive passes
+    jpeg_params = [cv2.IMWRITE_JPEG_QUALITY, args.jpeg_quality,
+                   cv2.IMWRITE_JPEG_OPTIMIZE, 0, cv2.IMWRITE_JPEG_PROGRESSIVE, 0]
+
+    # Read ahead a fixed window of frames past the one being collected; advising
+    # the whole run at once would let late files evict early ones from the cache
+    ahead = 2 * args.workers
+    inputs = [path for pair in zip(mask_paths, frame_paths) for path in pair]
+    prefetch(inputs[:2 * ahead])
+
+    # Frames are independent; OpenCV releases the GIL while decoding, blending
+    # and encoding, so threads run them in parallel without pickling frames
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        worker = partial(process_frame, jpeg_params=jpeg_params, vis_width=args.vis_width)
+        results = executor.map(worker, mask_paths, frame_paths, output_paths)
+        for i, _ in enumerate(results):
+            prefetch(inputs[2 * (i + ahead):2 * (i + ahead + 1)])
+            if (i + 1) % 10 == 0:
+                print(f"  Processed {i+1}/{num}")
+
+    print(f"\n> Saved visualizations to {OUTPUT_DIR}/")
+    print(f"  Total files: {len(mask_files)}")
+    print(f"\nTo view:")
+    print(f"  ls {OUTPUT_DIR}/")
+    print(f"  # Open any vis_XXXX.jpg file to see the masks overlaid")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())